@@ -1,3 +1,6 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from shutil import copytree
 from tempfile import TemporaryDirectory
@@ -7,6 +10,23 @@ from .logging import get_logger
 log = get_logger(__name__)
 
 
+def scandir_recursive(path):
+    """Yield the `os.DirEntry` of every entry under a directory.
+
+    Directories are yielded before their contents and symlinks to
+    directories are not followed. Unreadable or vanished directories are
+    skipped.
+    """
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                yield entry
+                if entry.is_dir(follow_symlinks=False):
+                    yield from scandir_recursive(entry.path)
+    except (PermissionError, FileNotFoundError) as e:
+        log.debug("Skipping %s: %s", path, e)
+
+
 class DirWatcherContext:
     """Context manager to watch a directory for changes.
 
@@ -21,40 +41,89 @@ class DirWatcherContext:
     ...     new_files = ctx.newfiles
     ...     # make file B
     ... # file a is deleted, file B is kept
+
+    With `parallel_exit=True` the exit action is applied to files from
+    several threads at once when there are many of them, so it must be
+    thread-safe. Directories are always handled serially, after their
+    contents.
     """
 
-    def __init__(self, path, exit_action=None, update_on_exit=True):
+    # Below this many files the exit action is applied serially.
+    PARALLEL_EXIT_THRESHOLD = 4
+
+    def __init__(
+        self, path, exit_action=None, update_on_exit=True, parallel_exit=False
+    ):
         self.logger = get_logger(__name__)
         self.path = path
         self.exit_action = exit_action
         self.newfiles = []
+        self._is_dir = {}
         self.update_on_exit = update_on_exit
+        self.parallel_exit = parallel_exit
 
     def __enter__(self):
         self.enter()
 
     def enter(self):
-        self.pre_files = list(Path(self.path).rglob("*"))
+        self.pre_files = frozenset(x.path for x in scandir_recursive(self.path))
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         self.exit(update=self.update_on_exit)
 
     def exit(self, update=True):
+        """Apply the exit action to the new files and return them.
+
+        With `update=False` the directory is not walked again and the
+        files found by the last call to `update` are used instead.
+        """
         gen_files = self.newfiles
         if update:
             gen_files = self.update()
 
         for file in gen_files:
             self.logger.debug(file)
-            if self.exit_action:
-                self.exit_action(file)
+        if self.exit_action:
+            self._apply_exit_action(gen_files)
         return gen_files
 
+    def _apply_exit_action(self, files):
+        if not self.parallel_exit or len(files) <= self.PARALLEL_EXIT_THRESHOLD:
+            for file in files:
+                self.exit_action(file)
+            return
+
+        # A directory can only be handled after its contents, so only the
+        # other entries are dispatched concurrently. Entries are classified
+        # with what the walk in `update` already knows, falling back to a
+        # stat for files it did not see.
+        dirs, others = [], []
+        for file in files:
+            is_dir = self._is_dir.get(os.fspath(file))
+            if is_dir is None:
+                is_dir = os.path.isdir(file)
+            (dirs if is_dir else others).append(file)
+
+        if others:
+            with ThreadPoolExecutor(max_workers=min(32, len(others))) as ex:
+                list(ex.map(self.exit_action, others))
+        for file in dirs:
+            self.exit_action(file)
+
     def update(self):
-        gen_files = list(
-            x for x in Path(self.path).rglob("*") if x not in self.pre_files
-        )[::-1]
+        """Walk the directory and store the files created since `enter`."""
+        # Parents are walked before their contents, so reversing the walk
+        # order puts files before the directories that contain them.
+        gen_files, is_dir = [], {}
+        for entry in scandir_recursive(self.path):
+            if entry.path in self.pre_files:
+                continue
+            gen_files.append(Path(entry.path))
+            # Cached from the directory listing, this does not stat.
+            is_dir[entry.path] = entry.is_dir(follow_symlinks=False)
+        gen_files.reverse()
         self.newfiles = gen_files
+        self._is_dir = is_dir
         return gen_files
 
 
@@ -90,15 +159,15 @@ class CloneDir(TemporaryDirectory):
         copytree(str(self.path), self.name, dirs_exist_ok=True)
 
     def __enter__(self):
-        log.debug(f"Cloning {self.path} to {self.name}")
+        log.debug("Cloning %s to %s", self.path, self.name)
         return super().__enter__()
 
     def cleanup(self):
-        log.debug(f"Cleaning up {self.name}")
-        contents = list(Path(self.name).glob("*"))
-        contents = [str(x) for x in contents]
-        log.debug(f"Removing: {contents}")
+        log.debug("Cleaning up %s", self.name)
+        if log.isEnabledFor(logging.DEBUG):
+            contents = [str(x) for x in Path(self.name).glob("*")]
+            log.debug("Removing: %s", contents)
         super().cleanup()
 
     def list_files(self):
-        return list(Path(self.name).rglob("*"))
+        return [Path(x.path) for x in scandir_recursive(self.name)]
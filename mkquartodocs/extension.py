@@ -13,13 +13,31 @@ log = get_logger(__name__)
 # TODO: implement ways to actually use the information ...
 
 
+# Unanchored bodies of the opening patterns, shared by the public per-pattern
+# regexes and the fused one.
+_CELL_PATTERN = r"::: \{\.cell .*}\s*$"
+_CELL_ELEM_PATTERN = (
+    r":{3,4} \{(\.cell(-\w+)?)\s?(?P<output_type>\.cell-[\w-]+)?"
+    r"(?P<execution_count> execution_count=\"\d+\")?\}"
+)
+_CODEBLOCK_PATTERN = r"```{\.(?P<lang>\w+) .*}"
+
+
 class AdmotionCellDataPreprocessor(Preprocessor):
-    CELL_REGEX: Final = re.compile(r"^::: \{\.cell .*}\s*$")
+    CELL_REGEX: Final = re.compile(rf"^{_CELL_PATTERN}")
     CELL_END: Final = re.compile(r"^:{3,4}?$")
-    CELL_ELEM_REGEX: Final = re.compile(
-        r"^:{3,4} \{(\.cell(-\w+)?)\s?(\.cell-[\w-]+)?( execution_count=\"\d+\")?\}"
+    CELL_ELEM_REGEX: Final = re.compile(rf"^{_CELL_ELEM_PATTERN}")
+    CODEBLOCK_REGEX: Final = re.compile(rf"^{_CODEBLOCK_PATTERN}")
+    # Closing fences are plain strings, no need for the regex engine.
+    CELL_END_LINES: Final = frozenset({":::", "::::"})
+    # The opening patterns above fused into a single one, so every line only
+    # goes through the regex engine once. Alternatives are tried in order and
+    # matched at the start of the line with `re.match`.
+    LINE_REGEX: Final = re.compile(
+        rf"(?P<cell>{_CELL_PATTERN})"
+        rf"|(?P<cell_elem>{_CELL_ELEM_PATTERN})"
+        rf"|(?P<codeblock>{_CODEBLOCK_PATTERN})"
     )
-    CODEBLOCK_REGEX: Final = re.compile(r"^```{\.(\w+) .*}")
 
     # https://squidfunk.github.io/mkdocs-material/reference/admonitions/#supported-types
     TYPE_MAPPING: Final = {
@@ -31,39 +49,43 @@ class AdmotionCellDataPreprocessor(Preprocessor):
 
     def run(self, lines):
         log.info(f"Running {self}")
-        outs = [self._process_line(x) for x in lines]
-        log.debug(f"Removing {sum(1 for x in outs if x is None)} lines")
-        out = [x for x in outs if x is not None]
-        return out
+        return [self._process_line(x) for x in lines]
 
     def _process_line(self, line):
-        if sr := self.CELL_REGEX.search(line):
-            log.debug(f"Matched Cell start: {line}")
+        # Every pattern starts with a colon or backtick fence, most lines do not.
+        if not line.startswith((":::", "```")):
+            return line
+
+        kind = "cell_end" if line.rstrip() in self.CELL_END_LINES else None
+        if kind is None and (sr := self.LINE_REGEX.match(line)):
+            kind = sr.lastgroup
+
+        if kind == "cell":
+            log.debug("Matched Cell start: %s", line)
             out = "\n\n"
 
-        elif sr := self.CELL_END.search(line):
-            log.debug(f"Matched Cell end: {line}")
+        elif kind == "cell_end":
+            log.debug("Matched Cell end: %s", line)
             out = "\n\n"
 
-        elif sr := self.CELL_ELEM_REGEX.search(line):
-            groups = {i: x for i, x in enumerate(sr.groups())}
-            log.debug(f"Matched Cell element: {line}, groups: {groups}")
-            if groups[3]:
+        elif kind == "cell_elem":
+            groups = sr.groupdict()
+            log.debug("Matched Cell element: %s, groups: %s", line, groups)
+            if groups["execution_count"]:
                 out = "\n\n"
             else:
-                output_type = groups[2]
+                output_type = groups["output_type"]
                 out = self.TYPE_MAPPING[output_type]
 
-        elif sr := self.CODEBLOCK_REGEX.search(line):
-            groups = {i: x for i, x in enumerate(sr.groups())}
-            log.debug(f"Matched codeblock: {line} -> {groups}")
-            lang = sr.groups(1)
+        elif kind == "codeblock":
+            lang = sr.group("lang")
+            log.debug("Matched codeblock: %s -> %s", line, lang)
             out = f"```{lang}"
         else:
             out = line
 
         if line != out:
-            log.debug(f"Transformed {line} -> {out}")
+            log.debug("Transformed %s -> %s", line, out)
         return out
 
 
@@ -1,27 +1,158 @@
+import functools
+import hashlib
+import json
+import os
 import re
 import shutil
+import stat
 import subprocess
+import sys
+import threading
+import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 from mkdocs.config import config_options
+from mkdocs.exceptions import PluginError
 from mkdocs.plugins import BasePlugin
 
 from mkquartodocs.extension import QuartoCellDataExtension
 
-from .context import DirWatcherContext
+from .context import DirWatcherContext, scandir_recursive
 from .logging import get_logger
 
 log = get_logger(__name__)
 
+# Relative to the directory of mkdocs.yml, outside of both the docs and the
+# built site so it is neither rendered nor deployed.
+RENDER_CACHE_PATH = os.path.join(".cache", "mkquartodocs", "render-cache.json")
+
+RENDER_TRIES = 5
+
+# Keeps the output of concurrent renders from interleaving.
+_OUTPUT_LOCK = threading.Lock()
+
 
 def _delete_file(path):
     """Delete a file or an empty directory."""
-    path = Path(path)
-    if path.is_file():
-        path.unlink()
-    elif path.is_dir():
-        path.rmdir()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+
+    if stat.S_ISDIR(st.st_mode):
+        os.rmdir(path)
+    elif stat.S_ISREG(st.st_mode):
+        os.unlink(path)
+
+
+def _render_qmd(quarto, path, capture=False):
+    """Render a single quarto document to markdown, retrying on failure.
+
+    With `capture`, output is held back so that concurrent renders do not
+    interleave on the terminal, and is passed through in one piece once each
+    attempt finishes. Otherwise quarto writes to the terminal as it goes.
+    """
+    log.info(f"Rendering {path}")
+    delay = 0.1
+    for i in range(RENDER_TRIES):
+        try:
+            res = subprocess.run(
+                [quarto, "render", path, "--to=markdown"],
+                check=True,
+                capture_output=capture,
+                text=True,
+            )
+            if capture:
+                _write_output(res)
+            return path
+        except subprocess.CalledProcessError as e:
+            if capture:
+                _write_output(e)
+            # ERROR: Couldn't find open server
+            # it ocasionally fails with that error ...
+            if i == RENDER_TRIES - 1:
+                log.error(f"Quarto failed to render {path} after {RENDER_TRIES} tries")
+                log.error(f"Quarto failed with error: {e}")
+                raise
+            warnings.warn(f"Quarto failed to render {path}, retrying")
+            # The server error is transient, back off briefly before retrying.
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+
+def _write_output(res):
+    with _OUTPUT_LOCK:
+        sys.stdout.write(res.stdout or "")
+        sys.stderr.write(res.stderr or "")
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _output_path(qmd_path):
+    return qmd_path[: -len(".qmd")] + ".md"
+
+
+def _render_cache_file(config):
+    base = config["config_file_path"] or config["docs_dir"]
+    return os.path.join(os.path.dirname(os.path.abspath(base)), RENDER_CACHE_PATH)
+
+
+def _load_render_cache(path):
+    """Load the source and output digests of previously rendered documents.
+
+    Missing, unreadable or malformed caches are treated as empty.
+    """
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _cache_entry(qmd_path):
+    """Digest a document and its output, or None if there is no output.
+
+    Quarto may have written the output elsewhere (e.g. `output-file:`).
+    """
+    try:
+        return {
+            "source": _file_digest(qmd_path),
+            "output": _file_digest(_output_path(qmd_path)),
+        }
+    except OSError:
+        return None
+
+
+def _is_cached_render(cache, key, qmd_path):
+    """Check that the .md on disk is what rendering the current source gave."""
+    entry = cache.get(key)
+    return isinstance(entry, dict) and entry == _cache_entry(qmd_path)
+
+
+def _record_render(cache, key, qmd_path):
+    entry = _cache_entry(qmd_path)
+    if entry is None:
+        cache.pop(key, None)
+    else:
+        cache[key] = entry
+
+
+def _save_render_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+@functools.lru_cache(maxsize=8)
+def _resolve_quarto(path):
+    """Locate the quarto executable, caching it across config reloads."""
+    return shutil.which(path if path else "quarto")
 
 
 class MkQuartoDocsPlugin(BasePlugin):
@@ -29,18 +160,25 @@ class MkQuartoDocsPlugin(BasePlugin):
         ("quarto_path", config_options.Type(Path)),
         ("ignore", config_options.Type(str)),
         ("keep_output", config_options.Type(bool, default=False)),
+        ("jobs", config_options.Type(int, default=1)),
+        ("force_rebuild", config_options.Type(bool, default=False)),
     )
 
     def on_config(self, config, **kwargs):
-        passed_path = self.config["quarto_path"]
-        quarto = shutil.which(passed_path if passed_path else "quarto")
-        self.config["quarto_path"] = quarto
-        # self.ignores = [re.compile(x) for x in self.config["ignore"]]
+        if self.config["jobs"] < 1:
+            raise PluginError(
+                f"mkquartodocs: 'jobs' must be at least 1, got {self.config['jobs']}"
+            )
 
+        quarto = _resolve_quarto(self.config["quarto_path"])
+        if quarto is None:
+            # Do not remember a miss, quarto may be installed before a reload.
+            _resolve_quarto.cache_clear()
+        self.config["quarto_path"] = quarto
         if self.config["ignore"]:
-            self.ignores = [re.compile(self.config["ignore"])]
+            self.ignore_regex = re.compile(self.config["ignore"])
         else:
-            self.ignores = []
+            self.ignore_regex = None
         self.exit_action = _delete_file if not self.config["keep_output"] else None
 
         self.extension = QuartoCellDataExtension()
@@ -48,51 +186,88 @@ class MkQuartoDocsPlugin(BasePlugin):
         return config
 
     def _filter_ignores(self, paths):
-        out = []
-        for x in paths:
-            if not any(re.fullmatch(pattern, x) for pattern in self.ignores):
-                out.append(x)
+        if self.ignore_regex is None:
+            return list(paths)
+        return [x for x in paths if not self.ignore_regex.fullmatch(x)]
 
-        return out
+    def _render_all(self, quarto, to_render, docs_dir, render_cache):
+        jobs = max(1, min(self.config["jobs"], len(to_render)))
+        futures = []
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as ex:
+                futures = [
+                    ex.submit(_render_qmd, quarto, x, jobs > 1) for x in to_render
+                ]
+                try:
+                    # Handle renders as they finish, not in submission order,
+                    # so a slow document does not hold back reporting.
+                    for i, future in enumerate(as_completed(futures), start=1):
+                        x = future.result()
+                        log.info(f"Rendered {x} ({i}/{len(to_render)})")
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            # Renders still running when another one failed have finished
+            # by now, record every one that succeeded.
+            for future in futures:
+                if future.done() and not future.cancelled() and not future.exception():
+                    x = future.result()
+                    _record_render(render_cache, os.path.relpath(x, docs_dir), x)
 
     def on_pre_build(self, config):
         quarto = self.config["quarto_path"]
         docs_dir = config["docs_dir"]
 
-        quarto_docs = Path(docs_dir).rglob("*.qmd")
-        quarto_docs = [str(x) for x in quarto_docs]
+        quarto_docs = (
+            x.path for x in scandir_recursive(docs_dir) if x.name.endswith(".qmd")
+        )
         quarto_docs = self._filter_ignores(quarto_docs)
 
         self.dir_context = DirWatcherContext(
-            docs_dir, exit_action=self.exit_action, update_on_exit=False
+            docs_dir,
+            exit_action=self.exit_action,
+            update_on_exit=False,
+            # _delete_file is safe to call from several threads.
+            parallel_exit=True,
         )
         self.dir_context.enter()
         if quarto_docs:
+            # Outputs are deleted after the build unless kept, so there is
+            # nothing for the cache to match against.
+            use_cache = self.config["keep_output"]
+            cache_file = _render_cache_file(config)
+            render_cache = _load_render_cache(cache_file) if use_cache else {}
+            to_render = []
             for x in quarto_docs:
-                x = Path(x)
-                parent_path = x.parent
-                expected_out = Path(parent_path) / (x.stem + ".md")
-                if expected_out.exists():
-                    qmd_mtime = x.stat().st_mtime
-                    md_mtime = expected_out.stat().st_mtime
-                    if qmd_mtime < md_mtime:
+                if self.config["force_rebuild"]:
+                    to_render.append(x)
+                    continue
+
+                expected_out = _output_path(x)
+                try:
+                    md_mtime = os.stat(expected_out).st_mtime
+                except FileNotFoundError:
+                    md_mtime = None
+                if md_mtime is not None:
+                    if os.stat(x).st_mtime < md_mtime:
                         log.info(f"Skipping {x} as it is older than {expected_out}")
                         continue
-                log.info(f"Rendering {x}")
-                for i in range(5):
-                    try:
-                        subprocess.run(
-                            [quarto, "render", str(x), "--to=markdown"], check=True
-                        )
-                        break
-                    except subprocess.CalledProcessError as e:
-                        # ERROR: Couldn't find open server
-                        # it ocasionally fails with that error ...
-                        if i == 4:
-                            log.error(f"Quarto failed to render {x} after 5 tries")
-                            log.error(f"Quarto failed with error: {e}")
-                            raise
-                        warnings.warn(f"Quarto failed to render {x}, retrying")
+                    # The mtime is not reliable after a checkout, so also
+                    # skip sources that have not changed since their render.
+                    key = os.path.relpath(x, docs_dir)
+                    if _is_cached_render(render_cache, key, x):
+                        log.info(f"Skipping {x} as it is unchanged since last render")
+                        continue
+                to_render.append(x)
+
+            try:
+                self._render_all(quarto, to_render, docs_dir, render_cache)
+            finally:
+                # Record the renders that succeeded, even if another failed.
+                if use_cache and to_render:
+                    _save_render_cache(cache_file, render_cache)
         else:
             warnings.warn(f"No quarto files were found in directory {docs_dir}")
 
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from mkquartodocs.context import DirWatcherContext
+from mkquartodocs.plugin import _delete_file
+
+
+def _make_outputs(base, num_files):
+    deep = base / "page_files" / "figure-markdown"
+    deep.mkdir(parents=True)
+    (base / "existing" / "new_dir").mkdir()
+    (base / "page.md").write_text("rendered")
+    for i in range(num_files):
+        (deep / f"fig-{i}.png").write_text("png")
+        (base / "existing" / "new_dir" / f"out-{i}.txt").write_text("txt")
+
+
+@pytest.mark.parametrize("num_files", [0, 10], ids=["serial", "parallel"])
+def test_exit_cleans_nested_tree(tmp_path, num_files):
+    (tmp_path / "existing").mkdir()
+    (tmp_path / "existing" / "keep.txt").write_text("keep")
+    (tmp_path / "page.qmd").write_text("source")
+    before = sorted(tmp_path.rglob("*"))
+
+    ctx = DirWatcherContext(tmp_path, exit_action=_delete_file, parallel_exit=True)
+    with ctx:
+        _make_outputs(tmp_path, num_files)
+
+    parallel = len(ctx.newfiles) > DirWatcherContext.PARALLEL_EXIT_THRESHOLD
+    assert parallel == (num_files > 0)
+    assert sorted(tmp_path.rglob("*")) == before
+
+
+def test_exit_handles_dirs_after_contents(tmp_path):
+    seen = []
+    lock = threading.Lock()
+
+    def record(path):
+        with lock:
+            seen.append(path)
+
+    (tmp_path / "existing").mkdir()
+    ctx = DirWatcherContext(tmp_path, exit_action=record, parallel_exit=True)
+    with ctx:
+        _make_outputs(tmp_path, 10)
+
+    assert sorted(seen) == sorted(ctx.newfiles)
+    for i, path in enumerate(seen):
+        if path.is_dir():
+            assert not any(path in x.parents for x in seen[i + 1 :])
+
+
+def test_exit_is_serial_by_default(tmp_path):
+    threads = set()
+    (tmp_path / "existing").mkdir()
+    ctx = DirWatcherContext(
+        tmp_path, exit_action=lambda _: threads.add(threading.get_ident())
+    )
+    with ctx:
+        _make_outputs(tmp_path, 10)
+
+    assert threads == {threading.get_ident()}
@@ -0,0 +1,210 @@
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+from mkdocs.exceptions import PluginError
+
+from mkquartodocs import plugin as plugin_module
+from mkquartodocs.plugin import MkQuartoDocsPlugin
+
+
+class FakeQuarto:
+    """Stands in for `subprocess.run`, rendering `x.qmd` by copying it to `x.md`."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fail = set()
+        self.write_output = True
+        self.captured = set()
+        # Set once a render that will succeed is running.
+        self.started = threading.Event()
+        self.rendered = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, args, **kwargs):
+        path = args[2]
+        self.captured.add(kwargs.get("capture_output", False))
+        if os.path.basename(path) in self.fail:
+            # Fail only once the other renders are under way, so that they
+            # are running rather than pending when the error surfaces.
+            self.started.wait(timeout=5)
+            raise subprocess.CalledProcessError(1, args, output="", stderr="boom")
+        self.started.set()
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        if self.write_output:
+            with open(path) as f, open(path[: -len(".qmd")] + ".md", "w") as out:
+                out.write(f.read())
+        with self._lock:
+            self.running -= 1
+            self.rendered.append(path)
+        return subprocess.CompletedProcess(args, 0, stdout="", stderr="")
+
+
+@pytest.fixture
+def fake_quarto(monkeypatch):
+    fake = FakeQuarto()
+    monkeypatch.setattr(plugin_module.subprocess, "run", fake)
+    return fake
+
+
+def make_plugin(**options):
+    plugin = MkQuartoDocsPlugin()
+    errors, _ = plugin.load_config(options)
+    assert not errors
+    plugin.on_config({"markdown_extensions": []})
+    return plugin
+
+
+def build_config(tmp_path):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir(exist_ok=True)
+    return {
+        "docs_dir": str(docs_dir),
+        "config_file_path": str(tmp_path / "mkdocs.yml"),
+        "site_dir": str(tmp_path / "site"),
+    }
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_jobs_bounds_concurrent_renders(tmp_path, fake_quarto, jobs):
+    config = build_config(tmp_path)
+    for i in range(6):
+        (tmp_path / "docs" / f"page{i}.qmd").write_text(f"page {i}")
+
+    fake_quarto.delay = 0.05
+    make_plugin(jobs=jobs).on_pre_build(config)
+
+    assert len(fake_quarto.rendered) == 6
+    assert fake_quarto.max_running == jobs
+    # Output is only held back when renders can interleave.
+    assert fake_quarto.captured == {jobs > 1}
+
+
+@pytest.mark.parametrize("jobs", [0, -2])
+def test_jobs_must_be_positive(jobs):
+    with pytest.raises(PluginError):
+        make_plugin(jobs=jobs)
+
+
+def touch_newer(path):
+    """Make `path` look newer than its rendered output."""
+    newer = os.stat(path).st_mtime + 10
+    os.utime(path, (newer, newer))
+
+
+@pytest.fixture
+def rendered_page(tmp_path, fake_quarto):
+    config = build_config(tmp_path)
+    qmd = tmp_path / "docs" / "page.qmd"
+    qmd.write_text("original")
+    make_plugin(keep_output=True).on_pre_build(config)
+    assert fake_quarto.rendered == [str(qmd)]
+    fake_quarto.rendered.clear()
+    return config, qmd
+
+
+def test_cache_hit_skips_touched_source(rendered_page, fake_quarto):
+    config, qmd = rendered_page
+    touch_newer(qmd)
+    make_plugin(keep_output=True).on_pre_build(config)
+    assert fake_quarto.rendered == []
+
+
+def test_cache_miss_on_changed_source(rendered_page, fake_quarto):
+    config, qmd = rendered_page
+    qmd.write_text("changed")
+    touch_newer(qmd)
+    make_plugin(keep_output=True).on_pre_build(config)
+    assert fake_quarto.rendered == [str(qmd)]
+
+
+def test_missing_output_is_rendered(rendered_page, fake_quarto):
+    config, qmd = rendered_page
+    qmd.with_suffix(".md").unlink()
+    make_plugin(keep_output=True).on_pre_build(config)
+    assert fake_quarto.rendered == [str(qmd)]
+
+
+def test_stale_output_is_rendered(rendered_page, fake_quarto):
+    config, qmd = rendered_page
+    qmd.with_suffix(".md").write_text("edited by hand")
+    touch_newer(qmd)
+    make_plugin(keep_output=True).on_pre_build(config)
+    assert fake_quarto.rendered == [str(qmd)]
+    assert qmd.with_suffix(".md").read_text() == "original"
+
+
+@pytest.mark.parametrize("contents", ["{not json", "[]", '"page.qmd"'])
+def test_malformed_cache_is_ignored(rendered_page, fake_quarto, contents):
+    config, qmd = rendered_page
+    cache_file = plugin_module._render_cache_file(config)
+    with open(cache_file, "w") as f:
+        f.write(contents)
+    touch_newer(qmd)
+    make_plugin(keep_output=True).on_pre_build(config)
+    assert fake_quarto.rendered == [str(qmd)]
+    assert isinstance(plugin_module._load_render_cache(cache_file), dict)
+
+
+def test_force_rebuild_ignores_cache(rendered_page, fake_quarto):
+    config, qmd = rendered_page
+    make_plugin(keep_output=True, force_rebuild=True).on_pre_build(config)
+    assert fake_quarto.rendered == [str(qmd)]
+
+
+def test_cache_lives_outside_docs_and_site(rendered_page):
+    config, _ = rendered_page
+    cache_file = plugin_module._render_cache_file(config)
+    assert os.path.isfile(cache_file)
+    for d in (config["docs_dir"], config["site_dir"]):
+        assert not cache_file.startswith(d + os.sep)
+
+
+def test_failed_render_keeps_successful_entries(tmp_path, fake_quarto, monkeypatch):
+    monkeypatch.setattr(plugin_module.time, "sleep", lambda _: None)
+    config = build_config(tmp_path)
+    good = tmp_path / "docs" / "good.qmd"
+    good.write_text("good")
+    (tmp_path / "docs" / "bad.qmd").write_text("bad")
+    fake_quarto.fail.add("bad.qmd")
+
+    with pytest.raises(subprocess.CalledProcessError):
+        make_plugin(keep_output=True, jobs=2).on_pre_build(config)
+
+    cache = plugin_module._load_render_cache(plugin_module._render_cache_file(config))
+    assert list(cache) == ["good.qmd"]
+    fake_quarto.rendered.clear()
+    fake_quarto.fail.clear()
+    touch_newer(good)
+    make_plugin(keep_output=True).on_pre_build(config)
+    assert fake_quarto.rendered == [str(tmp_path / "docs" / "bad.qmd")]
+
+
+def test_output_written_elsewhere_is_not_cached(tmp_path, fake_quarto):
+    config = build_config(tmp_path)
+    qmd = tmp_path / "docs" / "page.qmd"
+    qmd.write_text("source")
+    fake_quarto.write_output = False
+
+    make_plugin(keep_output=True).on_pre_build(config)
+
+    assert fake_quarto.rendered == [str(qmd)]
+    cache_file = plugin_module._render_cache_file(config)
+    assert plugin_module._load_render_cache(cache_file) == {}
+
+
+def test_cache_unused_without_keep_output(tmp_path, fake_quarto):
+    config = build_config(tmp_path)
+    (tmp_path / "docs" / "page.qmd").write_text("source")
+
+    make_plugin().on_pre_build(config)
+
+    assert len(fake_quarto.rendered) == 1
+    assert not os.path.exists(plugin_module._render_cache_file(config))
@@ -1,3 +1,5 @@
+import pytest
+
 from mkquartodocs.extension import AdmotionCellDataPreprocessor
 
 sample_cell_elements = [
@@ -9,6 +11,18 @@ sample_cell_elements = [
     "::::",
 ]
 
+sample_line_conversions = {
+    "::: {.cell .some-class}": "\n\n",
+    ":::": "\n\n",
+    "::::": "\n\n",
+    "::: {.cell-output .cell-output-stderr}": '!!! warning "stderr"',
+    "::: {.cell-output .cell-output-error}": '!!! danger "error"',
+    ':::: {.cell execution_count="2"}': "\n\n",
+    "```{.python .cell-code}": "```python",
+    "``` {.python .cell-code}": "``` {.python .cell-code}",
+    "Some text: with a colon": "Some text: with a colon",
+}
+
 # Tests from quarto version 1.5.56
 # Rendered with --to=markdown
 
@@ -37,6 +51,8 @@ warnings.warn("This is a warning")
       warnings.warn("This is a warning")
 """
 
+EXAMPLE_INPUT_LINES = EXAMMPLE_INPUT_FILE.splitlines()
+
 
 def test_conversion():
     preprocessor = AdmotionCellDataPreprocessor()
@@ -51,10 +67,41 @@ def test_conversion():
     ]
 
 
+@pytest.mark.parametrize("line,expected", sample_line_conversions.items())
+def test_line_conversion(line, expected):
+    preprocessor = AdmotionCellDataPreprocessor()
+    assert preprocessor._process_line(line) == expected
+
+
 def test_conversion_file_chunk():
     preprocessor = AdmotionCellDataPreprocessor()
-    file_lines = EXAMMPLE_INPUT_FILE.split("\n")
+    file_lines = EXAMPLE_INPUT_LINES
     out = [preprocessor._process_line(x) for x in file_lines]
 
     out_str = "\n".join(out)
     assert EXAMPLE_OUTPUT_FILE.strip() == out_str.strip()
+
+
+def test_run_file_chunk():
+    preprocessor = AdmotionCellDataPreprocessor()
+    file_lines = EXAMPLE_INPUT_LINES
+    out = preprocessor.run(file_lines)
+
+    assert out == [preprocessor._process_line(x) for x in file_lines]
+    out_str = "\n".join(out)
+    assert EXAMPLE_OUTPUT_FILE.strip() == out_str.strip()
+
+
+@pytest.mark.parametrize(
+    "name,line",
+    [
+        ("CELL_REGEX", "::: {.cell .py}"),
+        ("CELL_END", ":::"),
+        ("CELL_ELEM_REGEX", ":::: {.cell-output .cell-output-stdout}"),
+        ("CODEBLOCK_REGEX", "```{.python .cell-code}"),
+    ],
+)
+def test_public_patterns_are_anchored(name, line):
+    regex = getattr(AdmotionCellDataPreprocessor, name)
+    assert regex.search(line)
+    assert not regex.search("text " + line)